@@ -1,15 +1,20 @@
+import asyncio
+import csv
+import functools
 import os
 import re
 import textwrap
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
+import aiohttp
+import numpy as np
+import orjson
 import pandas as pd
-import requests
 from dotenv import load_dotenv
 
 from google import genai
-from google.genai import errors
+from google.genai import errors, types
 
 from colorama import Fore, Style, init as colorama_init
 
@@ -100,19 +105,16 @@ def separator() -> None:
 # UTIL
 # =========================
 
+_WS_RE = re.compile(r"\s+")
+_STRIP_TBL = str.maketrans("", "", "*`")
+
+
 def clean_text(text: str) -> str:
     """
     Remove formatação/markdown simples que pode confundir leigos.
     """
-    text = (text or "").strip()
-
-    text = text.replace("**", "")
-    text = text.replace("__", "")
-    text = text.replace("`", "")
-    text = text.replace("*", "")
-
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    text = (text or "").strip().replace("__", "").translate(_STRIP_TBL)
+    return _WS_RE.sub(" ", text).strip()
 
 
 def format_brl(value: float) -> str:
@@ -121,20 +123,143 @@ def format_brl(value: float) -> str:
     Ex: 20000.0 -> R$ 20.000,00
     """
     try:
-        n = float(value)
+        cents = int(round(float(value) * 100))
     except Exception:
-        n = 0.0
+        cents = 0
+
+    return _format_brl_cents(cents)
+
+
+def _format_brl_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    reais, centavos = divmod(abs(cents), 100)
+    return f"R$ {sign}{reais:,}".replace(",", ".") + f",{centavos:02d}"
+
+
+_BRL_WIDTH = 32
+
+
+# Abaixo disso o custo de carregar/compilar o Numba supera o ganho; usa o loop simples.
+_BRL_BULK_MIN_ROWS = 5000
+
+
+@functools.lru_cache(maxsize=None)
+def _get_brl_kernel():
+    """
+    Importa e compila o kernel Numba só na primeira vez que é necessário,
+    para que execuções pequenas nunca carreguem o Numba.
+    Sem o Numba instalado (dependência opcional), devolve None.
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(cache=True, parallel=True)
+    def _brl_kernel(cents: np.ndarray, out: np.ndarray) -> None:
+        """
+        Escreve cada valor (em centavos) como "R$ 1.234,56" em ASCII na linha de `out`.
+        Os caracteres são montados de trás para frente e depois copiados na ordem certa.
+        """
+        for i in prange(cents.shape[0]):
+            c = cents[i]
+            neg = c < 0
+            if neg:
+                c = -c
+            reais = c // 100
+            cent = c % 100
+
+            tmp = np.empty(_BRL_WIDTH, np.uint8)
+            n = 0
+            tmp[n] = 48 + cent % 10
+            tmp[n + 1] = 48 + cent // 10
+            tmp[n + 2] = 44  # ,
+            n += 3
+
+            k = 0
+            while True:
+                if k == 3:
+                    tmp[n] = 46  # .
+                    n += 1
+                    k = 0
+                tmp[n] = 48 + reais % 10
+                n += 1
+                k += 1
+                reais //= 10
+                if reais == 0:
+                    break
+
+            if neg:
+                tmp[n] = 45  # -
+                n += 1
+            tmp[n] = 32  # espaço
+            tmp[n + 1] = 36  # $
+            tmp[n + 2] = 82  # R
+            n += 3
+
+            for j in range(n):
+                out[i, j] = tmp[n - 1 - j]
+
+    return _brl_kernel
+
+
+def _format_brl_bulk(cents: np.ndarray) -> np.ndarray:
+    """
+    Versão em lote de format_brl: recebe centavos (int64) e devolve um array de strings.
+    """
+    kernel = _get_brl_kernel()
+    if kernel is None:
+        return np.array([_format_brl_cents(int(c)) for c in cents], dtype=str)
 
-    s = f"{n:,.2f}"  
-    s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-    return f"R$ {s}"
+    out = np.zeros((len(cents), _BRL_WIDTH), dtype=np.uint8)
+    kernel(np.ascontiguousarray(cents, dtype=np.int64), out)
+    return out.view(f"S{_BRL_WIDTH}").ravel().astype(str)
+
+
+def _brl_series(values: pd.Series) -> pd.Series:
+    amounts = pd.to_numeric(values, errors="coerce").fillna(0)
+    cents = (amounts * 100).round()
+
+    # Fora do intervalo do int64 o cast daria a volta; esses valores vão por format_brl.
+    fits = cents.abs() < 2.0**63
+    if not fits.all():
+        out = amounts.map(format_brl).astype(object)
+        out[fits] = _brl_series(amounts[fits])
+        return out
+
+    cents = cents.astype("int64")
+    if len(cents) < _BRL_BULK_MIN_ROWS:
+        return cents.map(_format_brl_cents)
+    return pd.Series(_format_brl_bulk(cents.to_numpy()), index=values.index)
+
+
+def _clean_text_series(texts: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de clean_text para uma coluna inteira.
+    """
+    return (
+        texts.str.replace("__", "", regex=False)
+        .str.translate(_STRIP_TBL)
+        .str.replace(_WS_RE, " ", regex=True)
+        .str.strip()
+    )
+
+
+_WRAPPER_CACHE: Dict[int, textwrap.TextWrapper] = {}
+
+
+def _wrapper(width: int) -> textwrap.TextWrapper:
+    wrapper = _WRAPPER_CACHE.get(width)
+    if wrapper is None:
+        wrapper = _WRAPPER_CACHE[width] = textwrap.TextWrapper(width=width, break_long_words=False)
+    return wrapper
 
 
 def wrap_text(text: str, width: int) -> str:
     text = (text or "").strip()
     if not text:
         return ""
-    return "\n".join(textwrap.wrap(text, width=width, break_long_words=False))
+    return "\n".join(_wrapper(width).wrap(text))
 
 
 # =========================
@@ -142,15 +267,19 @@ def wrap_text(text: str, width: int) -> str:
 # =========================
 
 def read_user_ids(csv_path: str) -> List[int]:
-    df = pd.read_csv(csv_path)
-
     col_candidates = ["user_id", "UserID"]
-    col = next((c for c in col_candidates if c in df.columns), None)
+
+    header = list(pd.read_csv(csv_path, nrows=0).columns)
+
+    col = next((c for c in col_candidates if c in header), None)
     if col is None:
         raise ValueError(
-            f"CSV precisa ter coluna 'user_id' ou 'UserID'. Colunas encontradas: {list(df.columns)}"
+            f"CSV precisa ter coluna 'user_id' ou 'UserID'. Colunas encontradas: {header}"
         )
 
+    # Lê apenas a coluna de IDs com o parser multithread do Arrow.
+    df = pd.read_csv(csv_path, usecols=[col], engine="pyarrow", dtype_backend="pyarrow")
+
     ids = df[col].dropna().astype(int).tolist()
     if not ids:
         raise ValueError("Nenhum ID encontrado no CSV.")
@@ -161,54 +290,105 @@ def read_user_ids(csv_path: str) -> List[int]:
 # EXTRACT (API -> Users)
 # =========================
 
-def get_user(api_url: str, user_id: int, timeout_sec: int) -> Optional[Dict[str, Any]]:
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Falhas transitórias do gateway são repetidas com backoff exponencial (0.3s, 0.6s, 1.2s).
+_RETRY_STATUS = {502, 503, 504}
+_RETRY_TOTAL = 3
+_RETRY_BACKOFF = 0.3
+
+
+async def _request(
+    session: aiohttp.ClientSession, method: str, url: str, timeout_sec: int, **kwargs: Any
+) -> Tuple[int, bytes]:
+    """
+    Faz a requisição repetindo em 502/503/504 e em erros de conexão.
+    Esgotadas as tentativas, devolve o último status/corpo para o tratamento de quem chamou.
+    """
+    timeout = aiohttp.ClientTimeout(total=timeout_sec)
+
+    for attempt in range(_RETRY_TOTAL):
+        try:
+            async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+                if resp.status not in _RETRY_STATUS:
+                    return resp.status, await resp.read()
+        except aiohttp.ClientConnectionError:
+            pass
+
+        await asyncio.sleep(_RETRY_BACKOFF * 2**attempt)
+
+    async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+        return resp.status, await resp.read()
+
+
+async def get_user_async(
+    session: aiohttp.ClientSession, api_url: str, user_id: int, timeout_sec: int
+) -> Optional[Dict[str, Any]]:
     url = f"{api_url}/usuario/{user_id}"
-    resp = requests.get(url, timeout=timeout_sec)
+    status, body = await _request(session, "GET", url, timeout_sec)
 
-    if resp.status_code == 200:
-        return resp.json()
+    if status == 200:
+        return orjson.loads(body)
 
-    if resp.status_code == 404:
+    if status == 404:
         warn(f"Usuário {user_id} não encontrado na API (404). Ignorando.")
         return None
 
-    error(f"GET {url} -> {resp.status_code} | {resp.text[:200]}")
+    error(f"GET {url} -> {status} | {body[:200].decode('utf-8', 'replace')}")
     return None
 
 
+async def _fetch_all(api_url: str, user_ids: List[int], timeout_sec: int) -> List[Dict[str, Any]]:
+    """
+    Busca todos os usuários em paralelo (tempo total ~ maior latência, não a soma).
+    """
+    connector = aiohttp.TCPConnector(limit=32)
+    timeout = aiohttp.ClientTimeout(total=timeout_sec)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(
+            *[get_user_async(session, api_url, uid, timeout_sec) for uid in user_ids]
+        )
+
+    return [u for u in results if u]
+
+
 # =========================
 # TABELA LEGÍVEL
 # =========================
 
+def _users_table(users: List[Dict[str, Any]], wrap_width: int) -> pd.DataFrame:
+    contas = [u.get("conta", {}) or {} for u in users]
+    news = pd.Series([u.get("news", []) or [] for u in users], dtype=object)
+    last_news = news.map(lambda n: (n[-1].get("descricao") or "") if n else "").astype(str)
+
+    # Só limpa/quebra as linhas que têm news; as vazias ficam "" direto.
+    has_news = last_news != ""
+    ultima = pd.Series("", index=last_news.index, dtype=object)
+    ultima[has_news] = _clean_text_series(last_news[has_news]).map(lambda t: wrap_text(t, wrap_width))
+
+    # Colunas de texto mantêm os valores originais (dtype object); só dinheiro é convertido.
+    return pd.DataFrame(
+        {
+            "ID": pd.Series([u.get("id") for u in users], dtype=object),
+            "Nome": pd.Series([u.get("nome") for u in users], dtype=object),
+            "Agência": pd.Series([c.get("agencia", "") for c in contas], dtype=object),
+            "Conta": pd.Series([c.get("numero", "") for c in contas], dtype=object),
+            "Saldo": _brl_series(pd.Series([c.get("balanco", 0.0) for c in contas], dtype=object)),
+            "Limite": _brl_series(pd.Series([c.get("limite", 0.0) for c in contas], dtype=object)),
+            "Qtd News": news.map(len),
+            "Última News": ultima,
+        }
+    ).sort_values(by="ID")
+
+
 def print_users_table(users: List[Dict[str, Any]], wrap_width: int) -> None:
     """
     Mostra resumo em tabela, com:
     - Saldo/Limite em moeda BR
     - Última News com quebra automática de linha (sem perder texto)
     """
-    rows = []
-    for u in users:
-        conta = u.get("conta", {}) or {}
-        news_list = u.get("news", []) or []
-        last_news = news_list[-1].get("descricao", "") if news_list else ""
-
-        balanco = float(conta.get("balanco", 0.0) or 0.0)
-        limite = float(conta.get("limite", 0.0) or 0.0)
-
-        rows.append(
-            {
-                "ID": u.get("id"),
-                "Nome": u.get("nome"),
-                "Agência": conta.get("agencia", ""),
-                "Conta": conta.get("numero", ""),
-                "Saldo": format_brl(balanco),
-                "Limite": format_brl(limite),
-                "Qtd News": len(news_list),
-                "Última News": wrap_text(clean_text(last_news), wrap_width),
-            }
-        )
-
-    df = pd.DataFrame(rows).sort_values(by="ID")
+    df = _users_table(users, wrap_width)
 
     with pd.option_context("display.max_colwidth", None, "display.width", 160):
         print(df.to_string(index=False))
@@ -225,30 +405,141 @@ def next_news_id(user: Dict[str, Any]) -> int:
     return max(int(n.get("id", 0)) for n in news_list) + 1
 
 
-def generate_ai_news_gemini(client: genai.Client, model: str, user: Dict[str, Any]) -> str:
+_PROMPT_PRE = "Você é um especialista em marketing bancário.\nCrie uma mensagem para "
+_PROMPT_POST = " sobre a importância dos investimentos (máximo de 100 caracteres)."
+_BATCH_PROMPT_PRE = (
+    "Você é um especialista em marketing bancário.\n"
+    "Para cada usuário abaixo, crie uma mensagem sobre a importância dos investimentos "
+    "(máximo de 100 caracteres). "
+    'Responda em JSON no formato [{"id": <id>, "msg": "..."}].\n'
+    "Usuários (id: nome):\n"
+)
+_FALLBACK_NEWS = "{nome}, investir com consistência fortalece seu futuro financeiro."
+
+
+def _fallback_news(nome: Any) -> str:
+    return clean_text(_FALLBACK_NEWS.format(nome=nome))[:100]
+
+
+async def generate_ai_news_gemini_async(
+    client: genai.Client, model: str, user: Dict[str, Any], sem: asyncio.Semaphore
+) -> str:
     nome = user.get("nome", "Cliente")
 
-    prompt = (
-        "Você é um especialista em marketing bancário.\n"
-        f"Crie uma mensagem para {nome} sobre a importância dos investimentos "
-        "(máximo de 100 caracteres)."
-    )
+    prompt = _PROMPT_PRE + str(nome) + _PROMPT_POST
 
     try:
-        response = client.models.generate_content(model=model, contents=prompt)
+        async with sem:
+            response = await client.aio.models.generate_content(model=model, contents=prompt)
         text = clean_text(getattr(response, "text", "") or "")
 
         if not text:
-            text = f"{nome}, investir com consistência fortalece seu futuro financeiro."
+            text = _fallback_news(nome)
 
         return text[:100]
 
     except errors.APIError as e:
         error(f"Gemini APIError {getattr(e, 'code', 'N/A')}: {getattr(e, 'message', str(e))}")
-        return clean_text(f"{nome}, investir com consistência fortalece seu futuro financeiro.")[:100]
+        return _fallback_news(nome)
     except Exception as e:
         error(f"Gemini erro inesperado: {e}")
-        return clean_text(f"{nome}, investir com consistência fortalece seu futuro financeiro.")[:100]
+        return _fallback_news(nome)
+
+
+_BATCH_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "id": types.Schema(type=types.Type.INTEGER),
+            "msg": types.Schema(type=types.Type.STRING),
+        },
+        required=["id", "msg"],
+    ),
+)
+
+
+async def generate_ai_news_gemini_batch(
+    client: genai.Client, model: str, users: List[Dict[str, Any]]
+) -> List[Optional[str]]:
+    """
+    Gera as mensagens de vários usuários numa única chamada ao Gemini (resposta em JSON).
+    Posições sem mensagem válida na resposta voltam como None; se a própria chamada
+    falhar, todas recebem a mensagem padrão.
+    """
+    msgs: List[Optional[str]] = [None] * len(users)
+    if not users:
+        return msgs
+
+    listing = "\n".join(f"{i}: {u.get('nome', 'Cliente')}" for i, u in enumerate(users))
+    prompt = _BATCH_PROMPT_PRE + listing
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=_BATCH_SCHEMA,
+    )
+
+    try:
+        response = await client.aio.models.generate_content(model=model, contents=prompt, config=config)
+    except Exception as e:
+        if isinstance(e, errors.APIError):
+            error(f"Gemini APIError {getattr(e, 'code', 'N/A')}: {getattr(e, 'message', str(e))}")
+        else:
+            error(f"Gemini erro inesperado: {e}")
+        # Falha da chamada (auth, cota...) se repetiria em cada chamada individual.
+        return [_fallback_news(u.get("nome", "Cliente")) for u in users]
+
+    try:
+        items = orjson.loads(getattr(response, "text", "") or "[]")
+
+        for item in items:
+            i = int(item.get("id", -1))
+            text = clean_text(item.get("msg") or "")
+            if 0 <= i < len(msgs) and text:
+                msgs[i] = text[:100]
+
+    except Exception as e:
+        warn(f"Resposta em lote do Gemini inválida ({e}); usando chamadas individuais.")
+
+    return msgs
+
+
+async def _generate_all(client: genai.Client, model: str, users: List[Dict[str, Any]]) -> List[str]:
+    """
+    Gera as mensagens de todos os usuários numa chamada em lote; as que faltarem são
+    geradas em paralelo (no máximo 8 chamadas simultâneas).
+    Usuários com o mesmo nome compartilham a mesma mensagem.
+    """
+    names = [u.get("nome", "Cliente") for u in users]
+
+    by_name: Dict[Any, Dict[str, Any]] = {}
+    for nome, u in zip(names, users):
+        by_name.setdefault(nome, u)
+
+    reps = list(by_name.values())
+
+    # O cliente assíncrono fica preso ao loop do asyncio.run; fecha antes dele terminar.
+    try:
+        msgs: List[Optional[str]] = await generate_ai_news_gemini_batch(client, model, reps)
+
+        # Quem ficou sem mensagem no lote cai para chamadas individuais.
+        missing = [i for i, m in enumerate(msgs) if not m]
+        if missing:
+            if len(missing) < len(reps):
+                warn(f"Lote do Gemini incompleto; gerando {len(missing)} mensagem(ns) individualmente.")
+            sem = asyncio.Semaphore(8)
+            fallback = await asyncio.gather(
+                *[generate_ai_news_gemini_async(client, model, reps[i], sem) for i in missing]
+            )
+            for i, m in zip(missing, fallback):
+                msgs[i] = m
+    finally:
+        try:
+            await client.aio.aclose()
+        except Exception:
+            pass
+
+    cache = dict(zip(by_name, msgs))
+    return [cache[nome] for nome in names]
 
 
 def transform_add_news_gemini(settings: Settings, users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -257,18 +548,22 @@ def transform_add_news_gemini(settings: Settings, users: List[Dict[str, Any]]) -
 
     client = genai.Client(api_key=settings.gemini_api_key)
 
-    for u in users:
-        msg = generate_ai_news_gemini(client, settings.gemini_model, u)
+    msgs = asyncio.run(_generate_all(client, settings.gemini_model, users))
+
+    # Anexa só depois do gather para manter os IDs de news determinísticos.
+    for u, msg in zip(users, msgs):
         length = len(msg)
+        nid = next_news_id(u)
 
-        u.setdefault("news", [])
-        u["news"].append(
+        news = u.get("news") or []
+        news.append(
             {
-                "id": next_news_id(u),
+                "id": nid,
                 "icone": settings.icon_url,
                 "descricao": msg,
             }
         )
+        u["news"] = news
 
         ok(f"News (Gemini) gerada para {u.get('nome')} -> {msg} ({length} caracteres)")
 
@@ -284,43 +579,74 @@ def transform_add_news_gemini(settings: Settings, users: List[Dict[str, Any]]) -
 # LOAD (PUT -> API)
 # =========================
 
-def update_user(api_url: str, user: Dict[str, Any], timeout_sec: int) -> bool:
+async def update_user_async(
+    session: aiohttp.ClientSession, api_url: str, user: Dict[str, Any], timeout_sec: int
+) -> bool:
     user_id = user.get("id")
     url = f"{api_url}/usuario/{user_id}"
 
-    resp = requests.put(url, json=user, timeout=timeout_sec)
-    if resp.status_code == 200:
+    status, body = await _request(
+        session, "PUT", url, timeout_sec, data=orjson.dumps(user), headers=_JSON_HEADERS
+    )
+    if status == 200:
         return True
 
-    error(f"PUT {url} -> {resp.status_code} | {resp.text[:200]}")
+    error(f"PUT {url} -> {status} | {body[:200].decode('utf-8', 'replace')}")
     return False
 
 
+async def _put_all(api_url: str, users: List[Dict[str, Any]], timeout_sec: int) -> List[Any]:
+    """
+    Envia todas as atualizações em paralelo, numa única sessão HTTP.
+    """
+    connector = aiohttp.TCPConnector(limit=16)
+    timeout = aiohttp.ClientTimeout(total=timeout_sec)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(
+            *[update_user_async(session, api_url, u, timeout_sec) for u in users],
+            return_exceptions=True,
+        )
+
+    for u, r in zip(users, results):
+        if isinstance(r, BaseException):
+            error(f"PUT usuário {u.get('id')} falhou: {r}")
+
+    return results
+
+
 # =========================
 # REPORT (Excel)
 # =========================
 
 def save_report_csv(users: List[Dict[str, Any]], path: str) -> None:
-    rows = []
-    for u in users:
-        conta = u.get("conta", {}) or {}
-        news_list = u.get("news", []) or []
-        last_news = news_list[-1].get("descricao", "") if news_list else ""
-
-        rows.append(
-            {
-                "user_id": u.get("id"),
-                "nome": u.get("nome"),
-                "agencia": conta.get("agencia", ""),
-                "conta": conta.get("numero", ""),
-                "balanco": conta.get("balanco", 0.0),
-                "limite": conta.get("limite", 0.0),
-                "qtd_news_total": len(news_list),
-                "ultima_news": clean_text(last_news),
-            }
+    """
+    Grava o relatório linha a linha, sem montar um DataFrame intermediário.
+    """
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(
+            ["user_id", "nome", "agencia", "conta", "balanco", "limite", "qtd_news_total", "ultima_news"]
         )
 
-    pd.DataFrame(rows).to_csv(path, index=False, encoding="utf-8-sig")
+        for u in users:
+            conta = u.get("conta") or {}
+            news = u.get("news") or []
+            last_news = (news[-1].get("descricao") or "") if news else ""
+
+            w.writerow(
+                (
+                    u.get("id"),
+                    u.get("nome"),
+                    conta.get("agencia", ""),
+                    conta.get("numero", ""),
+                    conta.get("balanco", 0.0),
+                    conta.get("limite", 0.0),
+                    len(news),
+                    clean_text(last_news) if last_news else "",
+                )
+            )
+
     info(f"Relatório gerado para Excel: {path}")
 
 
@@ -340,11 +666,7 @@ def main():
 
     separator()
 
-    users: List[Dict[str, Any]] = []
-    for uid in user_ids:
-        u = get_user(settings.api_url, uid, settings.timeout_sec)
-        if u:
-            users.append(u)
+    users = asyncio.run(_fetch_all(settings.api_url, user_ids, settings.timeout_sec))
 
     if not users:
         raise RuntimeError("Nenhum usuário válido foi carregado da API.")
@@ -360,10 +682,8 @@ def main():
 
     save_report_csv(users, settings.report_path)
 
-    ok_count = 0
-    for u in users:
-        if update_user(settings.api_url, u, settings.timeout_sec):
-            ok_count += 1
+    results = asyncio.run(_put_all(settings.api_url, users, settings.timeout_sec))
+    ok_count = sum(1 for r in results if r is True)
 
     done(f"Atualizações concluídas: {ok_count}/{len(users)}")
     done(f"Abra o relatório no Excel: {settings.report_path}")
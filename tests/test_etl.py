@@ -0,0 +1,170 @@
+import asyncio
+import random
+import types
+
+import numpy as np
+import pandas as pd
+from google.genai import errors
+
+import etl
+
+
+def _row(df, user_id):
+    return df[df["ID"] == user_id].iloc[0]
+
+
+def test_users_table_without_news():
+    users = [
+        {"id": 2, "nome": "Ana", "news": []},
+        {"id": 1, "nome": "Bob", "news": None},
+        {"id": 3, "nome": "Caio"},
+    ]
+
+    df = etl._users_table(users, wrap_width=40)
+
+    assert list(df["ID"]) == [1, 2, 3]
+    assert list(df["Qtd News"]) == [0, 0, 0]
+    assert list(df["Última News"]) == ["", "", ""]
+    assert list(df["Saldo"]) == ["R$ 0,00"] * 3
+    assert list(df["Limite"]) == ["R$ 0,00"] * 3
+
+
+def test_print_users_table_all_empty_news(capsys):
+    etl.print_users_table([{"id": 1, "nome": "Ana", "news": []}], wrap_width=40)
+
+    assert "Ana" in capsys.readouterr().out
+
+
+def test_users_table_keeps_numeric_conta_when_another_user_has_none():
+    users = [
+        {
+            "id": 1,
+            "nome": "Ana",
+            "conta": {"agencia": "0001", "numero": 1234, "balanco": 20000.0, "limite": 500},
+            "news": [{"id": 1, "descricao": "**Invista**   já"}],
+        },
+        {"id": 2, "nome": "Bob"},
+    ]
+
+    df = etl._users_table(users, wrap_width=40)
+    ana, bob = _row(df, 1), _row(df, 2)
+
+    assert ana["Conta"] == 1234
+    assert ana["Agência"] == "0001"
+    assert ana["Saldo"] == "R$ 20.000,00"
+    assert ana["Limite"] == "R$ 500,00"
+    assert ana["Qtd News"] == 1
+    assert ana["Última News"] == "Invista já"
+
+    assert bob["Conta"] == ""
+    assert bob["Agência"] == ""
+    assert bob["Saldo"] == "R$ 0,00"
+
+    assert "1234.0" not in df.to_string(index=False)
+
+
+def test_users_table_formats_amounts_beyond_int64():
+    df = etl._users_table([{"id": 1, "conta": {"balanco": 1e20}}], wrap_width=40)
+
+    assert _row(df, 1)["Saldo"] == etl.format_brl(1e20)
+
+
+_BRL_AMOUNTS = [
+    0.0, 0.01, -0.01, 0.99, 1.0, -1.0, 999.0, 999.99, 1000.0, -1000.0,
+    999999.99, 1000000.0, -999999.99, -1000000.0, 1234567.89, -20000.5,
+]
+
+
+def _bulk_matches_format_brl(amounts):
+    cents = np.array([int(round(a * 100)) for a in amounts], dtype=np.int64)
+    assert list(etl._format_brl_bulk(cents)) == [etl.format_brl(a) for a in amounts]
+
+
+def test_format_brl_bulk_matches_format_brl():
+    _bulk_matches_format_brl(_BRL_AMOUNTS)
+
+
+def test_format_brl_bulk_matches_format_brl_above_threshold():
+    rng = random.Random(0)
+    amounts = _BRL_AMOUNTS + [
+        round(rng.uniform(-1e9, 1e9), 2) for _ in range(etl._BRL_BULK_MIN_ROWS)
+    ]
+
+    _bulk_matches_format_brl(amounts)
+    assert list(etl._brl_series(pd.Series(amounts))) == [etl.format_brl(a) for a in amounts]
+
+
+def test_format_brl_bulk_without_numba(monkeypatch):
+    monkeypatch.setattr(etl, "_get_brl_kernel", lambda: None)
+
+    _bulk_matches_format_brl(_BRL_AMOUNTS)
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, batch):
+        self.batch = batch
+        self.single_calls = []
+
+    async def generate_content(self, model, contents, config=None):
+        if config is not None:
+            if isinstance(self.batch, Exception):
+                raise self.batch
+            return _FakeResponse(self.batch)
+        self.single_calls.append(contents)
+        return _FakeResponse("mensagem individual")
+
+
+class _FakeClient:
+    def __init__(self, batch):
+        self.aio = types.SimpleNamespace(models=_FakeModels(batch), aclose=self._aclose)
+        self.closed = False
+
+    async def _aclose(self):
+        self.closed = True
+
+
+_USERS = [{"id": 10, "nome": "Ana"}, {"id": 20, "nome": "Bob"}, {"id": 30, "nome": "Ana"}]
+
+
+def test_generate_all_maps_batch_ids_to_users():
+    batch = '[{"id": 1, "msg": "**Oi** Bob"}, {"id": 0, "msg": "Oi Ana"}]'
+    client = _FakeClient(batch)
+
+    msgs = asyncio.run(etl._generate_all(client, "m", _USERS))
+
+    assert msgs == ["Oi Ana", "Oi Bob", "Oi Ana"]
+    assert client.aio.models.single_calls == []
+    assert client.closed
+
+
+def test_generate_all_falls_back_per_user_for_partial_batch():
+    client = _FakeClient('[{"id": 0, "msg": "Oi Ana"}]')
+
+    msgs = asyncio.run(etl._generate_all(client, "m", _USERS))
+
+    assert msgs == ["Oi Ana", "mensagem individual", "Oi Ana"]
+    assert len(client.aio.models.single_calls) == 1
+    assert "Bob" in client.aio.models.single_calls[0]
+
+
+def test_generate_all_falls_back_per_user_for_invalid_json():
+    client = _FakeClient("não é json")
+
+    msgs = asyncio.run(etl._generate_all(client, "m", _USERS))
+
+    assert msgs == ["mensagem individual"] * 3
+    assert len(client.aio.models.single_calls) == 2
+
+
+def test_generate_all_uses_default_message_on_batch_api_error():
+    client = _FakeClient(errors.APIError(429, {"error": {"message": "quota"}}))
+
+    msgs = asyncio.run(etl._generate_all(client, "m", _USERS))
+
+    assert msgs == [etl._fallback_news("Ana"), etl._fallback_news("Bob"), etl._fallback_news("Ana")]
+    assert client.aio.models.single_calls == []